@@ -1,16 +1,35 @@
 import streamlit as st
 import yfinance as yf
-import plotly.graph_objects as go
 import pandas as pd
 import db_config
+import auth
 import chatbot
 import crypto
 import portfolio
+import snapshots
+import charts
 from db_config import get_db_connection
 from decimal import Decimal
 st.set_page_config(page_title="QUANTIFI", layout="wide")
 st.title("Welcome to QUANTIFI")
 
+@st.cache_data(ttl=900, show_spinner=False)
+def load_ohlc(ticker, period):
+    history = yf.Ticker(ticker).history(period=period, interval="1d")
+    # drop the exchange timezone so bars stay on their local trading dates instead of shifting to UTC
+    return history.index.tz_localize(None).to_numpy(dtype="datetime64[ns]"), history[["Open", "High", "Low", "Close"]].to_numpy(dtype=float)
+
+def start_session(session):
+    st.session_state["logged_in"] = True
+    st.session_state["user_id"] = session["uid"]
+    st.session_state["username"] = session["usr"]
+    st.session_state["auth_session"] = session
+
+def end_session():
+    st.session_state["logged_in"] = False
+    for key in ("user_id", "username", "auth_session"):
+        st.session_state.pop(key, None)
+
 def login_signup_page():
     st.title("Welcome to QUANTIFI")
     tab1, tab2 = st.tabs(["Login", "Signup"])
@@ -19,11 +38,9 @@ def login_signup_page():
         username = st.text_input("Username", key="login_username")
         password = st.text_input("Password", type="password", key="login_password")
         if st.button("Login"):
-            user_id = db_config.verify_user(username, password)
+            user_id = auth.authenticate(username, password)
             if user_id:
-                st.session_state["logged_in"] = True
-                st.session_state["user_id"] = user_id
-                st.session_state["username"] = username
+                start_session(auth.issue_session(user_id, username))
                 st.success(f"Welcome back, {username}!")
             else:
                 st.error("Invalid login credentials")
@@ -41,15 +58,29 @@ def login_signup_page():
 if "logged_in" not in st.session_state:
     st.session_state["logged_in"] = False
 
+# the session is re-checked on every rerun so a password change ends the user's other
+# sessions, usually without a database round trip
+if st.session_state["logged_in"] and not auth.verify_session(st.session_state.get("auth_session")):
+    end_session()
+
 if not st.session_state["logged_in"]:
     login_signup_page()
 else:
     st.sidebar.write(f"Hello, {st.session_state['username']}!")
     if st.sidebar.button("Sign Out"):
-        st.session_state["logged_in"] = False
-        st.session_state.pop("user_id", None)
-        st.session_state.pop("username", None)
+        end_session()
         st.rerun()
+    with st.sidebar.expander("Change Password"):
+        old_password = st.text_input("Current Password", type="password", key="old_password")
+        new_password = st.text_input("New Password", type="password", key="new_password")
+        if st.button("Update Password"):
+            if not new_password:
+                st.warning("Please enter a new password.")
+            elif auth.change_password(st.session_state["username"], old_password, new_password):
+                start_session(auth.issue_session(st.session_state["user_id"], st.session_state["username"]))
+                st.success("Password updated.")
+            else:
+                st.error("Current password is incorrect.")
     page = st.sidebar.radio("Menu", ["Trading", "Portfolio Analysis", "Quantum Optimizer", "SIP Investment", "AI Chatbot", "Crypto Prices"])
 
     if page == "Trading":
@@ -67,16 +98,10 @@ else:
                 st.metric(f"{symbol} Latest Price", f"₹{latest_price:.2f}")
 
             st.subheader(f"{symbol} Candlestick Chart")
-            stock_data = stock_info.history(period="1mo", interval="1d")
-            if not stock_data.empty:
-                fig = go.Figure(data=[go.Candlestick(
-                    x=stock_data.index,
-                    open=stock_data['Open'],
-                    high=stock_data['High'],
-                    low=stock_data['Low'],
-                    close=stock_data['Close']
-                )])
-                fig.update_layout(title=f"{symbol} - Candlestick Chart", xaxis_title="Date", yaxis_title="Price (₹)")
+            chart_period = st.selectbox("Chart Period", ["1mo", "6mo", "1y", "5y"], index=0)
+            dates, ohlc = load_ohlc(symbol_bse, chart_period)
+            if len(dates):
+                fig = charts.candlestick_figure(dates, ohlc, title=f"{symbol} - Candlestick Chart")
                 st.plotly_chart(fig)
             else:
                 st.error("No stock data available.")
@@ -93,42 +118,59 @@ else:
             cursor = conn.cursor()
 
             if col1.button("Buy"):
-                cursor.execute("SELECT quantity, avg_price FROM portfolio WHERE user_id=%s AND stock_symbol=%s", 
-                               (current_user_id, symbol))
-                existing_stock = cursor.fetchone()
-
-                if existing_stock:
-                    old_quantity, old_avg_price = existing_stock
-                    old_quantity = int(old_quantity or 0)
-                    old_avg_price = Decimal(str(old_avg_price or 0))
-                    new_quantity = old_quantity + quantity
-                    new_avg_price = ((old_quantity * old_avg_price) + (quantity * latest_price)) / new_quantity
-                    cursor.execute("UPDATE portfolio SET quantity=%s, avg_price=%s WHERE user_id=%s AND stock_symbol=%s",
-                                   (new_quantity, new_avg_price, current_user_id, symbol))
-                else:
-                    cursor.execute("INSERT INTO portfolio (user_id, stock_symbol, quantity, avg_price) VALUES (%s, %s, %s, %s)", 
-                                   (current_user_id, symbol, int(quantity), latest_price))
+                try:
+                    conn.start_transaction()
+                    snapshots.lock_valuation(cursor, current_user_id)
+                    snapshots.apply_trade(cursor, current_user_id, symbol, int(quantity), latest_price)
+                    cursor.execute("SELECT quantity, avg_price FROM portfolio WHERE user_id=%s AND stock_symbol=%s", 
+                                   (current_user_id, symbol))
+                    rows = cursor.fetchall()
+                    existing_stock = rows[0] if rows else None
+
+                    if existing_stock:
+                        old_quantity, old_avg_price = existing_stock
+                        old_quantity = int(old_quantity or 0)
+                        old_avg_price = Decimal(str(old_avg_price or 0))
+                        new_quantity = old_quantity + quantity
+                        new_avg_price = ((old_quantity * old_avg_price) + (quantity * latest_price)) / new_quantity
+                        cursor.execute("UPDATE portfolio SET quantity=%s, avg_price=%s, last_price=%s WHERE user_id=%s AND stock_symbol=%s",
+                                       (new_quantity, new_avg_price, latest_price, current_user_id, symbol))
+                    else:
+                        cursor.execute("INSERT INTO portfolio (user_id, stock_symbol, quantity, avg_price, last_price) VALUES (%s, %s, %s, %s, %s)", 
+                                       (current_user_id, symbol, int(quantity), latest_price, latest_price))
 
-                conn.commit()
-                st.success(f"Bought {quantity} shares of {symbol} at ₹{latest_price:.2f} each.")
+                    conn.commit()
+                    st.success(f"Bought {quantity} shares of {symbol} at ₹{latest_price:.2f} each.")
+                except Exception as e:
+                    conn.rollback()
+                    st.error(f"Trade failed, nothing was changed: {e}")
 
             if col2.button("Sell"):
-                cursor.execute("SELECT quantity FROM portfolio WHERE user_id=%s AND stock_symbol=%s", 
-                               (current_user_id, symbol))
-                stock_data = cursor.fetchone()
-
-                if stock_data and stock_data[0] >= quantity:
-                    new_quantity = stock_data[0] - quantity
-                    if new_quantity > 0:
-                        cursor.execute("UPDATE portfolio SET quantity=%s WHERE user_id=%s AND stock_symbol=%s",
-                                       (new_quantity, current_user_id, symbol))
+                try:
+                    conn.start_transaction()
+                    snapshots.lock_valuation(cursor, current_user_id)
+                    cursor.execute("SELECT quantity FROM portfolio WHERE user_id=%s AND stock_symbol=%s FOR UPDATE", 
+                                   (current_user_id, symbol))
+                    rows = cursor.fetchall()
+                    stock_data = rows[0] if rows else None
+
+                    if stock_data and stock_data[0] >= quantity:
+                        new_quantity = stock_data[0] - quantity
+                        snapshots.apply_trade(cursor, current_user_id, symbol, -int(quantity), latest_price)
+                        if new_quantity > 0:
+                            cursor.execute("UPDATE portfolio SET quantity=%s, last_price=%s WHERE user_id=%s AND stock_symbol=%s",
+                                           (new_quantity, latest_price, current_user_id, symbol))
+                        else:
+                            cursor.execute("DELETE FROM portfolio WHERE user_id=%s AND stock_symbol=%s",
+                                           (current_user_id, symbol))
+                        conn.commit()
+                        st.warning(f"Sold {quantity} shares of {symbol} at ₹{latest_price:.2f} each.")
                     else:
-                        cursor.execute("DELETE FROM portfolio WHERE user_id=%s AND stock_symbol=%s",
-                                       (current_user_id, symbol))
-                    conn.commit()
-                    st.warning(f"Sold {quantity} shares of {symbol} at ₹{latest_price:.2f} each.")
-                else:
-                    st.error("You don't have enough shares to sell.")
+                        conn.rollback()
+                        st.error("You don't have enough shares to sell.")
+                except Exception as e:
+                    conn.rollback()
+                    st.error(f"Trade failed, nothing was changed: {e}")
 
             conn.close()
         else:
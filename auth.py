@@ -0,0 +1,109 @@
+import hashlib
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+import db_config
+
+SESSION_TTL_SECONDS = int(os.getenv("QUANTIFI_SESSION_TTL", str(12 * 3600)))
+USER_CACHE_SIZE = int(os.getenv("QUANTIFI_USER_CACHE_SIZE", "1024"))
+# cached credentials are re-read after this long, so hash changes made elsewhere take effect
+USER_CACHE_TTL_SECONDS = int(os.getenv("QUANTIFI_USER_CACHE_TTL", "60"))
+# checked against unknown usernames so a failed lookup costs as much as a wrong password
+_DUMMY_HASH = db_config.hash_password(secrets.token_hex(16))
+
+_user_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cache_get(username):
+    with _cache_lock:
+        entry = _user_cache.get(username)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[2] > USER_CACHE_TTL_SECONDS:
+            del _user_cache[username]
+            return None
+        _user_cache.move_to_end(username)
+        return entry[:2]
+
+def _cache_put(username, user_id, stored_password):
+    with _cache_lock:
+        _user_cache[username] = (user_id, stored_password, time.monotonic())
+        _user_cache.move_to_end(username)
+        if len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+def invalidate_user(username):
+    with _cache_lock:
+        _user_cache.pop(username, None)
+
+def _load_user(username):
+    entry = _cache_get(username)
+    if entry is None:
+        result = db_config.get_user_credentials(username)
+        if not result:
+            return None
+        entry = (result[0], result[1])
+        _cache_put(username, *entry)
+    return entry
+
+def _credential_version(stored_password):
+    # changes whenever the stored hash changes, so a password change revokes older sessions
+    return hashlib.sha256(stored_password.encode()).hexdigest()[:16]
+
+def authenticate(username, password):
+    entry = _cache_get(username)
+    if entry is None or not db_config.check_password(password, entry[1]):
+        # cache miss, or a cached hash made stale by a password change in another process
+        result = db_config.get_user_credentials(username)
+        if not result:
+            invalidate_user(username)
+            db_config.check_password(password, _DUMMY_HASH)
+            return None
+        if entry is not None and result[1] == entry[1]:
+            return None
+        entry = (result[0], result[1])
+        _cache_put(username, *entry)
+        if not db_config.check_password(password, entry[1]):
+            return None
+
+    user_id, stored_password = entry
+    if db_config.password_needs_rehash(stored_password):
+        stored_password = db_config.hash_password(password)
+        db_config.update_password_hash(user_id, stored_password)
+        _cache_put(username, user_id, stored_password)
+    return user_id
+
+def issue_session(user_id, username, ttl=SESSION_TTL_SECONDS):
+    # Sessions live in server-side session state, which the browser cannot edit, so they are
+    # not signed; they only record who logged in, until when, and which password hash was current.
+    entry = _load_user(username)
+    if entry is None:
+        raise ValueError(f"Unknown user: {username}")
+    return {
+        "uid": user_id,
+        "usr": username,
+        "exp": int(time.time()) + ttl,
+        "ver": _credential_version(entry[1]),
+    }
+
+def verify_session(session):
+    if not session or session["exp"] < time.time():
+        return None
+    # the credential version is always checked; a cache miss costs one lookup, never a pass
+    entry = _load_user(session["usr"])
+    if entry is None or entry[0] != session["uid"] or session["ver"] != _credential_version(entry[1]):
+        return None
+    return session
+
+def change_password(username, old_password, new_password):
+    user_id = authenticate(username, old_password)
+    if user_id is None:
+        return False
+    stored_password = db_config.hash_password(new_password)
+    db_config.update_password_hash(user_id, stored_password)
+    _cache_put(username, user_id, stored_password)
+    return True
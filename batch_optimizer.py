@@ -0,0 +1,136 @@
+import argparse
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import db_config
+import quantum_optimizer
+from portfolio import calculate_stock_metrics_with_fallbacks
+
+FETCH_SIZE = 1000
+WRITE_CHUNK_SIZE = 1000
+
+
+def stream_holdings(fetch_size=FETCH_SIZE):
+    conn = db_config.get_db_connection()
+    # unbuffered cursor: rows stay on the server until fetched, so memory is bounded by fetch_size
+    cursor = conn.cursor(buffered=False)
+    try:
+        cursor.execute("SELECT user_id, stock_symbol FROM portfolio WHERE quantity > 0 ORDER BY user_id")
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        cursor.close()
+        conn.close()
+
+def group_problems(rows):
+    # rows must be ordered by user_id; users holding the same set of symbols share one problem
+    problems = defaultdict(list)
+    current_user, holdings = None, set()
+    for user_id, symbol in rows:
+        if user_id != current_user:
+            if holdings:
+                problems[tuple(sorted(holdings))].append(current_user)
+            current_user, holdings = user_id, set()
+        holdings.add(symbol)
+    if holdings:
+        problems[tuple(sorted(holdings))].append(current_user)
+    return dict(problems)
+
+def solve_problem(task):
+    symbols, stocks_data, options = task
+    try:
+        allocation, method = quantum_optimizer.qaoa_optimize_with_method(stocks_data, **options)
+    except Exception as e:
+        print(f"Optimization failed for {symbols}: {e}")
+        method = "classical"
+        allocation = quantum_optimizer.classical_optimization_fallback(stocks_data)
+    return symbols, allocation, method
+
+def _recommendation_rows(results, problems, generated_at):
+    for symbols, allocation, method in results:
+        for user_id in problems[symbols]:
+            for stock, weight in allocation.items():
+                yield (user_id, stock, round(float(weight), 6), method, generated_at)
+
+def write_recommendations(results, problems, generated_at, keep_users=(), chunk_size=WRITE_CHUNK_SIZE):
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    query = """
+        INSERT INTO portfolio_recommendations (user_id, stock_symbol, weight, method, generated_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE weight = VALUES(weight), method = VALUES(method), generated_at = VALUES(generated_at)
+    """
+    written = 0
+    chunk = []
+    try:
+        for row in _recommendation_rows(results, problems, generated_at):
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                cursor.executemany(query, chunk)
+                written += len(chunk)
+                chunk = []
+        if chunk:
+            cursor.executemany(query, chunk)
+            written += len(chunk)
+        # rows not refreshed in this run belong to sold-off holdings or emptied portfolios,
+        # except for users in keep_users, whose problems were skipped and keep their last recommendation
+        cursor.execute("CREATE TEMPORARY TABLE IF NOT EXISTS batch_kept_users (user_id INT PRIMARY KEY)")
+        cursor.execute("DELETE FROM batch_kept_users")
+        keep_users = [(user_id,) for user_id in keep_users]
+        for start in range(0, len(keep_users), chunk_size):
+            cursor.executemany("INSERT INTO batch_kept_users (user_id) VALUES (%s)", keep_users[start:start + chunk_size])
+        cursor.execute("""
+            DELETE r FROM portfolio_recommendations r
+            LEFT JOIN batch_kept_users k ON k.user_id = r.user_id
+            WHERE r.generated_at < %s AND k.user_id IS NULL
+        """, (generated_at,))
+        cursor.execute("DROP TEMPORARY TABLE batch_kept_users")
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    return written
+
+def run_batch(workers=None, backend_name="aer", shots=256, p=1, maxiter=100, mode="blend", max_qubits=12):
+    generated_at = datetime.now().replace(microsecond=0)
+    problems = group_problems(stream_holdings())
+    if not problems:
+        print("No portfolios to optimize.")
+        return 0
+
+    symbols = sorted(set().union(*problems))
+    metrics, fallbacks = calculate_stock_metrics_with_fallbacks(symbols)
+    if len(fallbacks) == len(symbols):
+        # nothing was fetched; writing default-metric allocations would replace every good row
+        print("No price history fetched; keeping the existing recommendations.")
+        return 0
+    fallbacks = set(fallbacks)
+    skipped = {key: user_ids for key, user_ids in problems.items() if fallbacks.intersection(key)}
+    problems = {key: user_ids for key, user_ids in problems.items() if key not in skipped}
+    if skipped:
+        print(f"Skipping {len(skipped)} portfolios holding symbols without price history: {', '.join(sorted(fallbacks))}")
+    options = {"backend_name": backend_name, "shots": shots, "p": p, "maxiter": maxiter, "mode": mode, "max_qubits": max_qubits}
+    tasks = [(key, {stock: metrics[stock] for stock in key}, options) for key in problems]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(solve_problem, tasks, chunksize=max(1, len(tasks) // 64)))
+
+    users = sum(len(user_ids) for user_ids in problems.values())
+    kept_users = [user_id for user_ids in skipped.values() for user_id in user_ids]
+    written = write_recommendations(results, problems, generated_at, keep_users=kept_users)
+    print(f"Solved {len(problems)} distinct portfolios for {users} users across {len(symbols)} symbols; wrote {written} rows.")
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nightly portfolio optimization for all users")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--backend", default="aer")
+    parser.add_argument("--shots", type=int, default=256)
+    parser.add_argument("--maxiter", type=int, default=100)
+    parser.add_argument("--mode", choices=["best", "blend"], default="blend")
+    args = parser.parse_args()
+    run_batch(workers=args.workers, backend_name=args.backend, shots=args.shots, maxiter=args.maxiter, mode=args.mode)
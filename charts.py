@@ -0,0 +1,152 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import plotly.graph_objects as go
+
+import market_data
+
+DEFAULT_POINT_BUDGET = 5000
+MIN_POINTS_PER_SERIES = 50
+FIGURE_CACHE_SIZE = 64
+
+_FIGURE_CACHE = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+
+def fetch_close_matrix(stock_symbols, period="6mo", interval="1d"):
+    # one download for all symbols, aligned on a shared date index
+    if not stock_symbols:
+        return np.array([], dtype="datetime64[ns]"), np.empty((0, 0))
+    closes = market_data.download_closes(stock_symbols, period=period, interval=interval).ffill()
+    return closes.index.to_numpy(dtype="datetime64[ns]"), closes.to_numpy(dtype=float)
+
+def lttb_indices(x, y, budget):
+    # Largest-Triangle-Three-Buckets: keeps the first and last point and, per bucket,
+    # the point forming the largest triangle with the previous pick and the next bucket's mean
+    n = len(y)
+    if budget >= n or budget < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, budget - 1).astype(int)
+    selected = np.empty(budget, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(budget - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax_indices(y, budget):
+    # keeps each bucket's minimum and maximum so spikes survive downsampling
+    n = len(y)
+    if budget >= n or budget < 4:
+        return np.arange(n)
+    buckets = budget // 2
+    width = -(-n // buckets)
+    highs = np.full(buckets * width, -np.inf)
+    lows = np.full(buckets * width, np.inf)
+    highs[:n] = np.where(np.isnan(y), -np.inf, y)
+    lows[:n] = np.where(np.isnan(y), np.inf, y)
+    offsets = np.arange(buckets) * width
+    idx = np.concatenate([
+        [0, n - 1],
+        offsets + highs.reshape(buckets, width).argmax(axis=1),
+        offsets + lows.reshape(buckets, width).argmin(axis=1),
+    ])
+    idx = np.unique(idx)
+    return idx[idx < n]
+
+def downsample_series(x, y, budget, method="lttb"):
+    valid = np.flatnonzero(~np.isnan(y))
+    if method == "lttb":
+        keep = lttb_indices(x[valid], y[valid], budget)
+    elif method == "minmax":
+        keep = minmax_indices(y[valid], budget)
+    else:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return valid[keep]
+
+def downsample_ohlc(dates, ohlc, budget):
+    # merges consecutive bars: first open, highest high, lowest low, last close
+    n = len(dates)
+    if n <= budget:
+        return dates, ohlc
+    starts = np.linspace(0, n, budget, endpoint=False).astype(int)
+    ends = np.append(starts[1:], n) - 1
+    merged = np.column_stack([
+        ohlc[starts, 0],
+        np.fmax.reduceat(ohlc[:, 1], starts),
+        np.fmin.reduceat(ohlc[:, 2], starts),
+        ohlc[ends, 3],
+    ])
+    return dates[starts], merged
+
+def _digest(*parts):
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update(part.tobytes() if isinstance(part, np.ndarray) else repr(part).encode())
+    return h.hexdigest()
+
+def _cached_figure(key, build):
+    with _figure_cache_lock:
+        fig_json = _FIGURE_CACHE.get(key)
+        if fig_json is not None:
+            _FIGURE_CACHE.move_to_end(key)
+    if fig_json is None:
+        # build outside the lock; a concurrent build of the same key just stores an identical figure
+        fig_json = build().to_json()
+        with _figure_cache_lock:
+            _FIGURE_CACHE[key] = fig_json
+            _FIGURE_CACHE.move_to_end(key)
+            if len(_FIGURE_CACHE) > FIGURE_CACHE_SIZE:
+                _FIGURE_CACHE.popitem(last=False)
+    return json.loads(fig_json)
+
+def cumulative_returns_figure(dates, matrix, names, title="Cumulative Returns", point_budget=DEFAULT_POINT_BUDGET, method="lttb"):
+    key = ("cumulative", _digest(dates, matrix, list(names)), title, point_budget, method)
+
+    def build():
+        fig = go.Figure()
+        # no price history at all (e.g. a failed download): an empty chart rather than an error
+        if len(dates) and matrix.size:
+            first_valid = np.argmax(~np.isnan(matrix), axis=0)
+            base = matrix[first_valid, np.arange(matrix.shape[1])]
+            normalized = matrix / base * 100
+            x = dates.astype("datetime64[s]").astype(float)
+            per_series = max(MIN_POINTS_PER_SERIES, point_budget // max(1, len(names)))
+            for j, name in enumerate(names):
+                idx = downsample_series(x, normalized[:, j], per_series, method)
+                fig.add_trace(go.Scatter(x=dates[idx], y=normalized[idx, j], mode="lines", name=name))
+        fig.update_layout(
+            title=title,
+            xaxis_title="Date",
+            yaxis_title="Normalized Price",
+            template="plotly_dark"
+        )
+        return fig
+
+    return _cached_figure(key, build)
+
+def candlestick_figure(dates, ohlc, title, point_budget=300):
+    key = ("candlestick", _digest(dates, ohlc), title, point_budget)
+
+    def build():
+        x, bars = downsample_ohlc(dates, ohlc, point_budget)
+        fig = go.Figure(data=[go.Candlestick(
+            x=x,
+            open=bars[:, 0],
+            high=bars[:, 1],
+            low=bars[:, 2],
+            close=bars[:, 3]
+        )])
+        fig.update_layout(title=title, xaxis_title="Date", yaxis_title="Price (₹)")
+        return fig
+
+    return _cached_figure(key, build)
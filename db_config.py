@@ -1,19 +1,55 @@
 import mysql.connector
+from mysql.connector import pooling
 import hashlib
+import hmac
+import os
+import secrets
+import threading
+
+DB_SETTINGS = {
+    "host": "localhost",
+    "user": "root",
+    "password": "sri@sql49",
+    "database": "trading_platform",
+}
+POOL_SIZE = int(os.getenv("QUANTIFI_DB_POOL_SIZE", "8"))
+# PBKDF2 cost is paid once per login; raise it as hardware gets faster
+PBKDF2_ITERATIONS = int(os.getenv("QUANTIFI_PBKDF2_ITERATIONS", "600000"))
+
+_pool = None
+_pool_lock = threading.Lock()
 
 
 def get_db_connection():
-    conn = mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="sri@sql49",
-        database="trading_platform"
-    )
-    conn.autocommit = True
-    return conn
-
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(pool_name="quantifi", pool_size=POOL_SIZE, autocommit=True, **DB_SETTINGS)
+    try:
+        return _pool.get_connection()
+    except mysql.connector.errors.PoolError:
+        conn = mysql.connector.connect(**DB_SETTINGS)
+        conn.autocommit = True
+        return conn
+
+def hash_password(password, iterations=None):
+    iterations = iterations or PBKDF2_ITERATIONS
+    salt = secrets.token_hex(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+    return f"pbkdf2_sha256${iterations}${salt}${digest}"
+
+def check_password(password, stored_password):
+    if stored_password.startswith("pbkdf2_sha256$"):
+        _, iterations, salt, digest = stored_password.split("$")
+        candidate = hashlib.pbkdf2_hmac("sha256", password.encode(), salt.encode(), int(iterations)).hex()
+        return hmac.compare_digest(candidate, digest)
+    # legacy unsalted SHA-256 hashes, upgraded on the next successful login
+    return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored_password)
+
+def password_needs_rehash(stored_password):
+    if not stored_password.startswith("pbkdf2_sha256$"):
+        return True
+    return int(stored_password.split("$")[1]) != PBKDF2_ITERATIONS
 
 def add_user(username, password):
     conn = get_db_connection()
@@ -28,19 +64,18 @@ def add_user(username, password):
         cursor.close()
         conn.close()
 
-def verify_user(username, password):
+def get_user_credentials(username):
     conn = get_db_connection()
     cursor = conn.cursor()
-    query = "SELECT user_id, password FROM users WHERE username = %s"
-    cursor.execute(query, (username,))
+    cursor.execute("SELECT user_id, password FROM users WHERE username = %s", (username,))
     result = cursor.fetchone()
-    if result:
-        stored_user_id, stored_password = result
-        hashed_input_password = hash_password(password)
-        if hashed_input_password == stored_password:
-            cursor.close()
-            conn.close()
-            return stored_user_id
     cursor.close()
     conn.close()
-    return None
+    return result
+
+def update_password_hash(user_id, hashed_password):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("UPDATE users SET password = %s WHERE user_id = %s", (hashed_password, user_id))
+    cursor.close()
+    conn.close()
@@ -0,0 +1,21 @@
+import pandas as pd
+import yfinance as yf
+
+
+def bse_ticker(symbol):
+    return symbol if symbol.endswith(".BO") else symbol + ".BO"
+
+def download_closes(stock_symbols, period="6mo", interval="1d"):
+    # one yfinance request for all symbols; columns are the given symbols, missing ones are all-NaN.
+    # Closes are split- and dividend-adjusted so corporate actions do not show up as returns.
+    if not stock_symbols:
+        return pd.DataFrame()
+    tickers = [bse_ticker(stock) for stock in stock_symbols]
+    closes = yf.download(tickers, period=period, interval=interval, group_by="column", auto_adjust=True, progress=False)["Close"]
+    if isinstance(closes, pd.Series):
+        closes = closes.to_frame(tickers[0])
+    closes = closes.reindex(columns=tickers)
+    if getattr(closes.index, "tz", None) is not None:
+        closes.index = closes.index.tz_localize(None)
+    closes.columns = list(stock_symbols)
+    return closes
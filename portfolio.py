@@ -5,21 +5,30 @@ import db_config
 import plotly.express as px
 import plotly.graph_objects as go
 import quantum_optimizer
+import snapshots
+import charts
+import market_data
 import numpy as np
 
+CHART_PERIODS = {"6mo": "6 Months", "1y": "1 Year", "5y": "5 Years"}
+
+
+@st.cache_data(ttl=900, show_spinner=False)
+def load_close_matrix(stocks, period):
+    return charts.fetch_close_matrix(list(stocks), period=period)
 
 def get_portfolio_data(user_id):
     conn = db_config.get_db_connection() 
     cursor = conn.cursor()
-    cursor.execute("SELECT stock_symbol, quantity, avg_price FROM portfolio WHERE user_id = %s", (user_id,))
+    cursor.execute("SELECT stock_symbol, quantity, avg_price, last_price FROM portfolio WHERE user_id = %s", (user_id,))
     data = cursor.fetchall()  
     cursor.close()
     conn.close()
     
     if data:
-        return pd.DataFrame(data, columns=["Stock", "Quantity", "Avg. Price"])
+        return pd.DataFrame(data, columns=["Stock", "Quantity", "Avg. Price", "Latest Price"])
     else:
-        return pd.DataFrame(columns=["Stock", "Quantity", "Avg. Price"]) 
+        return pd.DataFrame(columns=["Stock", "Quantity", "Avg. Price", "Latest Price"]) 
 
 def fetch_stock_prices(stocks):
     prices = {}
@@ -32,23 +41,42 @@ def fetch_stock_prices(stocks):
             print(f"Error fetching stock data for {stock}: {e}")
     return prices
 
-def calculate_stock_metrics(stock_symbol, period="6mo"):
+def calculate_stock_metrics_with_fallbacks(stock_symbols, period="6mo"):
+    # returns the metrics together with the symbols that had no history and got the defaults
+    default = {"return": 0.05, "volatility": 0.15}
+    metrics = {stock: dict(default) for stock in stock_symbols}
+    fetched = set()
+    if not stock_symbols:
+        return metrics, []
     try:
-        hist = yf.Ticker(stock_symbol + ".BO").history(period=period)
-        if hist.empty:
-            return {"return": 0.05, "volatility": 0.15}
-        
-        returns = hist["Close"].pct_change().dropna()
-        avg_return = returns.mean() * 252
-        volatility = returns.std() * np.sqrt(252)
-        
-        return {
-            "return": max(0.001, avg_return),
-            "volatility": max(0.01, volatility)
-        }
+        returns = market_data.download_closes(stock_symbols, period=period).pct_change()
+        avg_returns = returns.mean() * 252
+        volatilities = returns.std() * np.sqrt(252)
+        for stock in stock_symbols:
+            if returns[stock].count() == 0:
+                continue
+            metrics[stock] = {
+                "return": max(0.001, avg_returns[stock]),
+                "volatility": max(0.01, volatilities[stock])
+            }
+            fetched.add(stock)
     except Exception as e:
-        print(f"Error calculating metrics for {stock_symbol}: {e}")
-        return {"return": 0.05, "volatility": 0.15}
+        print(f"Error calculating bulk metrics: {e}")
+    return metrics, [stock for stock in stock_symbols if stock not in fetched]
+
+def calculate_stock_metrics_bulk(stock_symbols, period="6mo"):
+    metrics, _ = calculate_stock_metrics_with_fallbacks(stock_symbols, period=period)
+    return metrics
+
+def get_recommendations(user_id):
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT stock_symbol, weight, method, generated_at FROM portfolio_recommendations WHERE user_id = %s",
+                   (user_id,))
+    data = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return pd.DataFrame(data, columns=["Stock", "Weight", "Method", "Generated At"])
 
 def portfolio_analysis():
     st.markdown("<h1 style='text-align: center; color: white;'>Portfolio Analysis</h1>", unsafe_allow_html=True)
@@ -62,8 +90,14 @@ def portfolio_analysis():
         st.warning("Your portfolio is empty! Start investing to see insights.")  
         return
     
-    stock_prices = fetch_stock_prices(portfolio["Stock"].tolist())
-    portfolio["Latest Price"] = portfolio["Stock"].apply(lambda stock: stock_prices.get(stock, None))  
+    # prices come from the valuation state kept current by trades and price ticks;
+    # only holdings that have never been priced are fetched live
+    missing = portfolio["Latest Price"].isna()
+    if missing.any():
+        stock_prices = fetch_stock_prices(portfolio.loc[missing, "Stock"].tolist())
+        portfolio.loc[missing, "Latest Price"] = portfolio.loc[missing, "Stock"].map(stock_prices)
+    portfolio["Latest Price"] = portfolio["Latest Price"].astype(float)
+    portfolio["Avg. Price"] = portfolio["Avg. Price"].astype(float)
     portfolio["Investment Value"] = portfolio["Latest Price"] * portfolio["Quantity"]
     total_value = portfolio["Investment Value"].sum()
 
@@ -102,25 +136,41 @@ def portfolio_analysis():
     )
     st.plotly_chart(fig_bar, use_container_width=True)  
 
+    snapshots.ensure_valuation(user_id)
+    history = snapshots.get_snapshot_history(user_id)
+    if len(history) > 1:
+        st.markdown("Portfolio Value Over Time")
+        fig_value = go.Figure()
+        fig_value.add_trace(go.Scatter(x=history["Date"], y=history["Value"], mode="lines", name="Market Value"))
+        fig_value.add_trace(go.Scatter(x=history["Date"], y=history["Cost Basis"], mode="lines", name="Cost Basis",
+                                       line=dict(dash="dash")))
+        fig_value.update_layout(
+            title="Portfolio Value From Daily Snapshots",
+            xaxis_title="Date", yaxis_title="Value (₹)",
+            template="plotly_dark"
+        )
+        st.plotly_chart(fig_value, use_container_width=True)
+
+        fig_returns = go.Figure(go.Scatter(x=history["Date"], y=history["Return (%)"], mode="lines", name="Return"))
+        fig_returns.update_layout(
+            title="Portfolio Return Over Cost Basis",
+            xaxis_title="Date", yaxis_title="Return (%)",
+            template="plotly_dark"
+        )
+        st.plotly_chart(fig_returns, use_container_width=True)
+
     st.markdown("Cumulative Returns Over Time")
-    fig_line = go.Figure()
-    for stock in portfolio["Stock"]:
-        stock_data = yf.Ticker(stock + ".BO").history(period="6mo")["Close"]
-        stock_data = (stock_data / stock_data.iloc[0]) * 100 
-        fig_line.add_trace(go.Scatter(x=stock_data.index, y=stock_data, mode="lines", name=stock))
-
-    fig_line.update_layout(
-        title="Cumulative Returns Over 6 Months",
-        xaxis_title="Date",
-        yaxis_title="Normalized Price",
-        template="plotly_dark"
-    )
+    period = st.selectbox("Period", list(CHART_PERIODS), index=0, key="cumulative_period")
+    stocks = tuple(portfolio["Stock"])
+    dates, closes = load_close_matrix(stocks, period)
+    fig_line = charts.cumulative_returns_figure(dates, closes, stocks, title=f"Cumulative Returns Over {CHART_PERIODS[period]}")
     st.plotly_chart(fig_line, use_container_width=True) 
 
     st.markdown("Expected Returns & Risk")
-    stock_returns = {stock: yf.Ticker(stock + ".BO").history(period="6mo")["Close"].pct_change().mean() for stock in portfolio["Stock"]}
-    avg_return = sum(stock_returns.values()) / len(stock_returns) 
-    avg_risk = sum(yf.Ticker(stock + ".BO").history(period="6mo")["Close"].pct_change().std() for stock in portfolio["Stock"]) / len(stock_returns)  
+    recent = closes[dates >= dates[-1] - np.timedelta64(182, "D")] if len(dates) else closes
+    daily_returns = np.diff(recent, axis=0) / recent[:-1]
+    avg_return = np.nanmean(np.nanmean(daily_returns, axis=0))
+    avg_risk = np.nanmean(np.nanstd(daily_returns, axis=0, ddof=1))
 
     st.write(f"Expected Returns: {avg_return * 100:.2f}%")  
     st.write(f"Portfolio Risk (Volatility): {avg_risk * 100:.2f}%")
@@ -128,16 +178,22 @@ def portfolio_analysis():
     st.markdown("---")
     st.markdown("<h2 style='text-align: center; color: #00d4ff;'>Quantum Portfolio Optimizer (QAOA)</h2>", unsafe_allow_html=True)
     
+    recommendations = get_recommendations(user_id)
+    if not recommendations.empty:
+        generated_at = recommendations["Generated At"].max()
+        st.markdown(f"**Nightly Suggested Allocation** (generated {generated_at:%Y-%m-%d %H:%M}):")
+        st.dataframe(recommendations[["Stock", "Weight", "Method"]].style.format({"Weight": lambda w: f"{float(w)*100:.2f}%"}))
+
     if st.button("Optimize Portfolio with Quantum Algorithm", key="quantum_opt"):
         with st.spinner("Running quantum optimization on your portfolio..."):
             stocks_list = portfolio["Stock"].tolist()
-            stocks_data = {}
-            for stock in stocks_list:
-                metrics = calculate_stock_metrics(stock)
-                stocks_data[stock] = metrics
+            stocks_data, fallbacks = calculate_stock_metrics_with_fallbacks(stocks_list)
+            if fallbacks:
+                st.warning(f"No price history for {', '.join(fallbacks)}; using default return and volatility.")
 
             try:
-                optimized_allocation = quantum_optimizer.qaoa_optimize(stocks_data, shots=1024, p=1, max_qubits=12)
+                optimized_allocation = quantum_optimizer.qaoa_optimize(stocks_data, shots=256, p=1, max_qubits=12,
+                                                                     maxiter=100, mode="blend", top_k=5)
             except Exception as e:
                 st.error(f"Quantum optimization failed: {e}")
                 optimized_allocation = quantum_optimizer.classical_optimization_fallback(stocks_data)
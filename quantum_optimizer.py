@@ -1,13 +1,14 @@
+import math
 import numpy as np
 from decimal import Decimal
+from functools import lru_cache
 
 try:
     from qiskit import Aer
     from qiskit.utils import QuantumInstance
-    from qiskit.algorithms import QAOA
+    from qiskit.algorithms import QAOA, NumPyMinimumEigensolver
     from qiskit.algorithms.optimizers import COBYLA
     from qiskit_optimization import QuadraticProgram
-    from qiskit_optimization.converters import QuadraticProgramToIsing
     from qiskit_optimization.algorithms import MinimumEigenOptimizer
     QISKIT_AVAILABLE = True
 except Exception as e:
@@ -58,66 +59,246 @@ def calculate_portfolio_metrics(allocation, stocks_data):
         "sharpe_ratio": sharpe_ratio
     }
 
-def qaoa_optimize(stocks_data, backend_name="aer", shots=1024, p=1, risk_penalty=1.0, max_qubits=12, seed=42):
-    if not QISKIT_AVAILABLE:
-        raise RuntimeError(f"Qiskit or qiskit-optimization not available: {_QISKIT_IMPORT_ERROR}")
+def _linear_coefficients(stocks_data, stocks, risk_penalty):
+    mu = np.array([float(stocks_data[s]["return"]) if stocks_data[s]["return"] is not None else 0.0 for s in stocks])
+    sigma = np.array([float(stocks_data[s]["volatility"]) if stocks_data[s]["volatility"] is not None else 0.0 for s in stocks])
+    return -mu + risk_penalty * (sigma ** 2)
+
+def _build_quadratic_program(linear_coeffs):
+    qp = QuadraticProgram()
+    for i in range(len(linear_coeffs)):
+        qp.binary_var(name=f'x_{i}')
+
+    linear = {f'x_{i}': float(c) for i, c in enumerate(linear_coeffs)}
+    quadratic = {}
+    qp.minimize(linear=linear, quadratic=quadratic)
+    return qp
+
+@lru_cache(maxsize=None)
+def _aer_backend(backend_id):
+    return Aer.get_backend(backend_id)
+
+def _aer_qaoa_factory(backend_id):
+    def factory(shots, p, seed, maxiter):
+        quantum_instance = QuantumInstance(_aer_backend(backend_id), shots=shots,
+                                           seed_simulator=seed, seed_transpiler=seed)
+        qaoa = QAOA(optimizer=COBYLA(maxiter=maxiter), reps=p, quantum_instance=quantum_instance)
+        return MinimumEigenOptimizer(qaoa)
+    return factory
+
+def _exact_eigensolver_factory(shots, p, seed, maxiter):
+    return MinimumEigenOptimizer(NumPyMinimumEigensolver())
+
+def _shot_noise(shots):
+    return 1.0 / math.sqrt(max(shots or 1, 1))
+
+# Each engine declares its qubit limit, a relative cost model cost(n, shots, p, maxiter)
+# and the objective error it introduces for a given shot count.
+BACKEND_REGISTRY = {}
+BACKEND_ALIASES = {"aer": "sampler"}
+
+def register_backend(name, max_qubits, cost, error, factory=None, allocate=None, shot_based=False, requires_qiskit=True):
+    if (factory is None) == (allocate is None):
+        raise ValueError("A backend needs exactly one of factory or allocate")
+    BACKEND_REGISTRY[name] = {
+        "max_qubits": max_qubits,
+        "cost": cost,
+        "error": error,
+        "factory": factory,
+        "allocate": allocate,
+        "shot_based": shot_based,
+        "requires_qiskit": requires_qiskit,
+    }
+
+def backend_available(name):
+    spec = BACKEND_REGISTRY[name]
+    return QISKIT_AVAILABLE or not spec["requires_qiskit"]
+
+def select_backend(num_qubits, shots=1024, p=1, maxiter=250, accuracy=0.1, quantum_only=False):
+    candidates = []
+    for name, spec in BACKEND_REGISTRY.items():
+        if not backend_available(name) or num_qubits > spec["max_qubits"]:
+            continue
+        if quantum_only and spec["factory"] is None:
+            continue
+        if spec["error"](shots) > accuracy:
+            continue
+        candidates.append((spec["cost"](num_qubits, shots, p, maxiter), name))
+    if not candidates:
+        return None if quantum_only else "classical"
+    return min(candidates)[1]
+
+def resolve_backend(backend_name, num_qubits, shots=1024, p=1, maxiter=250, accuracy=0.1, quantum_only=False):
+    if backend_name == "auto":
+        return select_backend(num_qubits, shots=shots, p=p, maxiter=maxiter, accuracy=accuracy, quantum_only=quantum_only)
+    name = BACKEND_ALIASES.get(backend_name, backend_name)
+    if name not in BACKEND_REGISTRY:
+        raise ValueError(f"Unknown backend: {backend_name}")
+    return name
+
+def get_solver_engine(name, shots=1024, p=1, seed=42, maxiter=250):
+    # Only the Aer backends are shared; QAOA keeps per-solve ansatz and sampler state,
+    # so each solve gets its own engine and concurrent sessions cannot interfere.
+    spec = BACKEND_REGISTRY[name]
+    if spec["factory"] is None:
+        raise ValueError(f"Backend {name} is classical and has no solver engine")
+    if not spec["shot_based"]:
+        shots = None
+    return spec["factory"](shots, p, seed, maxiter)
+
+register_backend("statevector", max_qubits=24,
+                 cost=lambda n, shots, p, maxiter: maxiter * p * 2 ** n,
+                 error=lambda shots: 0.0,
+                 factory=_aer_qaoa_factory("aer_simulator_statevector"))
+register_backend("sampler", max_qubits=24,
+                 cost=lambda n, shots, p, maxiter: maxiter * p * (2 ** n + shots),
+                 error=_shot_noise,
+                 factory=_aer_qaoa_factory("aer_simulator"), shot_based=True)
+register_backend("mps", max_qubits=64,
+                 cost=lambda n, shots, p, maxiter: maxiter * (shots + p * n ** 3),
+                 error=_shot_noise,
+                 factory=_aer_qaoa_factory("aer_simulator_matrix_product_state"), shot_based=True)
+register_backend("exact", max_qubits=20,
+                 cost=lambda n, shots, p, maxiter: n * 2 ** n,
+                 error=lambda shots: 0.0,
+                 factory=_exact_eigensolver_factory)
+register_backend("classical", max_qubits=math.inf,
+                 cost=lambda n, shots, p, maxiter: n,
+                 error=lambda shots: 1.0,
+                 allocate=classical_optimization_fallback, requires_qiskit=False)
+register_backend("heuristic", max_qubits=math.inf,
+                 cost=lambda n, shots, p, maxiter: n,
+                 error=lambda shots: 1.0,
+                 allocate=sampling_heuristic, requires_qiskit=False)
+
+def _selection_weights(stocks_data, stocks, selections):
+    # selections is a (k, n) 0/1 matrix; each row is weighted by its positive returns
+    returns = np.maximum(np.array([float(stocks_data[s]["return"] or 0.0) for s in stocks]), 0.0)
+    masked = selections * returns
+    totals = masked.sum(axis=1, keepdims=True)
+    counts = selections.sum(axis=1, keepdims=True)
+    by_return = masked / np.where(totals == 0, 1.0, totals)
+    equal = selections / np.where(counts == 0, 1.0, counts)
+    return np.where(totals > 0, by_return, equal)
+
+def _collect_samples(result, num_stocks):
+    samples = getattr(result, "samples", None) or []
+    if samples:
+        selections = np.array([np.rint(s.x) for s in samples], dtype=np.int8).reshape(-1, num_stocks)
+        probabilities = np.array([float(s.probability) for s in samples])
+    else:
+        selections = np.rint(np.asarray(result.x)).astype(np.int8).reshape(1, num_stocks)
+        probabilities = np.ones(1)
 
+    selections, inverse = np.unique(selections, axis=0, return_inverse=True)
+    probabilities = np.bincount(inverse.ravel(), weights=probabilities, minlength=len(selections))
+    return selections, probabilities
+
+def qaoa_sample_distribution(stocks_data, top_k=5, shots=1024, p=1, risk_penalty=1.0, max_qubits=12, seed=42, maxiter=250,
+                             backend_name="aer", accuracy=0.1):
     stocks = list(stocks_data.keys())
     num_stocks = len(stocks)
 
     if num_stocks == 0:
-        return {}
-    if num_stocks == 1:
-        return {stocks[0]: 1.0}
+        return []
     if num_stocks > max_qubits:
-        return classical_optimization_fallback(stocks_data)
+        raise ValueError(f"{num_stocks} stocks exceeds max_qubits={max_qubits}")
 
-    qp = QuadraticProgram()
-    for i, stock in enumerate(stocks):
-        qp.binary_var(name=f'x_{i}')
+    name = resolve_backend(backend_name, num_stocks, shots=shots, p=p, maxiter=maxiter, accuracy=accuracy, quantum_only=True)
+    if name is None or BACKEND_REGISTRY[name]["factory"] is None:
+        raise ValueError(f"No sampling backend available for {num_stocks} stocks (requested {backend_name})")
+    if not backend_available(name):
+        raise RuntimeError(f"Qiskit or qiskit-optimization not available: {_QISKIT_IMPORT_ERROR}")
+    if num_stocks > BACKEND_REGISTRY[name]["max_qubits"]:
+        raise ValueError(f"{num_stocks} stocks exceeds the {name} backend limit")
 
-    linear = {}
-    quadratic = {}
-    for i, stock in enumerate(stocks):
-        mu = float(stocks_data[stock]["return"]) if stocks_data[stock]["return"] is not None else 0.0
-        sigma = float(stocks_data[stock]["volatility"]) if stocks_data[stock]["volatility"] is not None else 0.0
-        linear[f'x_{i}'] = -mu + risk_penalty * (sigma ** 2)
+    linear_coeffs = _linear_coefficients(stocks_data, stocks, risk_penalty)
+    engine = get_solver_engine(name, shots=shots, p=p, seed=seed, maxiter=maxiter)
+    result = engine.solve(_build_quadratic_program(linear_coeffs))
 
-    qp.minimize(linear=linear, quadratic=quadratic)
+    selections, probabilities = _collect_samples(result, num_stocks)
+    objectives = selections @ linear_coeffs
+    weights = _selection_weights(stocks_data, stocks, selections)
 
-    conv = QuadraticProgramToIsing()
-    qubit_op, offset = conv.convert(qp)
+    order = np.lexsort((objectives, -probabilities))[:top_k]
+    return [
+        {
+            "bitstring": "".join(str(int(b)) for b in selections[i]),
+            "selection": [stocks[j] for j in np.flatnonzero(selections[i])],
+            "probability": float(probabilities[i]),
+            "objective": float(objectives[i]),
+            "allocation": {stock: float(weights[i, j]) for j, stock in enumerate(stocks)},
+        }
+        for i in order
+    ]
 
-    backend = Aer.get_backend('aer_simulator') if backend_name == 'aer' else Aer.get_backend('aer_simulator')
-    quantum_instance = QuantumInstance(backend, shots=shots, seed_simulator=seed, seed_transpiler=seed)
+def blend_sample_allocations(samples, stocks):
+    samples = [s for s in samples if s["selection"]]
+    if not samples:
+        return {}
+    probabilities = np.array([s["probability"] for s in samples])
+    if probabilities.sum() == 0:
+        probabilities = np.ones_like(probabilities)
+    weights = np.array([[s["allocation"][stock] for stock in stocks] for s in samples])
+    blended = probabilities @ weights / probabilities.sum()
+    return normalize_portfolio_weights({stock: float(blended[j]) for j, stock in enumerate(stocks)})
 
-    optimizer = COBYLA(maxiter=250)
-    qaoa = QAOA(optimizer=optimizer, reps=p, quantum_instance=quantum_instance)
+def qaoa_optimize_with_method(stocks_data, backend_name="aer", shots=1024, p=1, risk_penalty=1.0, max_qubits=12, seed=42,
+                               maxiter=250, mode="best", top_k=5, accuracy=0.1):
+    # returns the allocation together with the backend that actually produced it
+    if mode not in ("best", "blend"):
+        raise ValueError(f"Unknown mode: {mode}")
 
-    meo = MinimumEigenOptimizer(qaoa)
-    try:
-        result = meo.solve(qp)
-    except Exception as e:
-        return classical_optimization_fallback(stocks_data)
+    stocks = list(stocks_data.keys())
+    num_stocks = len(stocks)
 
-    x = result.x
-    selected = [stocks[i] for i, val in enumerate(x) if int(round(val)) == 1]
+    if num_stocks == 0:
+        return {}, "none"
+    if num_stocks == 1:
+        return {stocks[0]: 1.0}, "single"
 
-    if len(selected) == 0:
-        return classical_optimization_fallback(stocks_data)
+    name = resolve_backend(backend_name, num_stocks, shots=shots, p=p, maxiter=maxiter, accuracy=accuracy)
+    spec = BACKEND_REGISTRY[name]
+    if not backend_available(name):
+        raise RuntimeError(f"Qiskit or qiskit-optimization not available: {_QISKIT_IMPORT_ERROR}")
+    if spec["allocate"] is not None:
+        return spec["allocate"](stocks_data), name
+    if num_stocks > min(max_qubits, spec["max_qubits"]):
+        return classical_optimization_fallback(stocks_data), "classical"
 
-    sel_returns = np.array([stocks_data[s]["return"] for s in selected])
-    sel_returns = np.maximum(sel_returns, 0.0)
-    if sel_returns.sum() == 0:
-        weights = np.ones_like(sel_returns) / len(sel_returns)
-    else:
-        weights = sel_returns / sel_returns.sum()
+    if mode == "blend":
+        try:
+            samples = qaoa_sample_distribution(stocks_data, top_k=top_k, shots=shots, p=p, risk_penalty=risk_penalty,
+                                               max_qubits=max_qubits, seed=seed, maxiter=maxiter, backend_name=name)
+        except Exception as e:
+            return classical_optimization_fallback(stocks_data), "classical"
+        allocation = blend_sample_allocations(samples, stocks)
+        if not allocation or sum(allocation.values()) == 0:
+            return classical_optimization_fallback(stocks_data), "classical"
+        return allocation, name
 
-    allocation = {stock: 0.0 for stock in stocks}
-    for i, stock in enumerate(selected):
-        allocation[stock] = float(weights[i])
+    linear_coeffs = _linear_coefficients(stocks_data, stocks, risk_penalty)
+    try:
+        engine = get_solver_engine(name, shots=shots, p=p, seed=seed, maxiter=maxiter)
+        result = engine.solve(_build_quadratic_program(linear_coeffs))
+    except Exception as e:
+        return classical_optimization_fallback(stocks_data), "classical"
+
+    selection = np.rint(np.asarray(result.x)).astype(np.int8).reshape(1, num_stocks)
+    if selection.sum() == 0:
+        return classical_optimization_fallback(stocks_data), "classical"
+
+    weights = _selection_weights(stocks_data, stocks, selection)[0]
+    allocation = {stock: float(weights[i]) for i, stock in enumerate(stocks)}
 
     allocation = normalize_portfolio_weights(allocation)
+    return allocation, name
+
+def qaoa_optimize(stocks_data, backend_name="aer", shots=1024, p=1, risk_penalty=1.0, max_qubits=12, seed=42,
+                  maxiter=250, mode="best", top_k=5, accuracy=0.1):
+    allocation, _ = qaoa_optimize_with_method(stocks_data, backend_name=backend_name, shots=shots, p=p,
+                                              risk_penalty=risk_penalty, max_qubits=max_qubits, seed=seed,
+                                              maxiter=maxiter, mode=mode, top_k=top_k, accuracy=accuracy)
     return allocation
 
 def generate_optimization_report(allocation, stocks_data, portfolio_df=None):
@@ -0,0 +1,172 @@
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+
+import db_config
+import market_data
+
+PRICE_QUANTUM = Decimal("0.01")
+
+
+def quantize_price(price):
+    # portfolio.last_price is DECIMAL(10,2); deltas must use the value that is actually stored
+    return Decimal(str(price)).quantize(PRICE_QUANTUM, rounding=ROUND_HALF_UP)
+
+def lock_valuation(cursor, user_id):
+    # Every trade path takes this lock first, before touching portfolio rows, so that
+    # buys, sells and price ticks always lock in the same order and cannot deadlock.
+    cursor.execute("SELECT market_value FROM portfolio_valuation WHERE user_id = %s FOR UPDATE", (user_id,))
+    if not cursor.fetchall():
+        _rebuild_valuation(cursor, user_id)
+
+def _rebuild_valuation(cursor, user_id):
+    cursor.execute("""
+        INSERT INTO portfolio_valuation (user_id, market_value, cost_basis)
+        SELECT %s, COALESCE(SUM(quantity * COALESCE(last_price, avg_price)), 0), COALESCE(SUM(quantity * avg_price), 0)
+        FROM portfolio WHERE user_id = %s
+        ON DUPLICATE KEY UPDATE market_value = VALUES(market_value), cost_basis = VALUES(cost_basis)
+    """, (user_id, user_id))
+
+def record_snapshot(cursor, user_id, snapshot_date=None):
+    cursor.execute("""
+        INSERT INTO portfolio_snapshots (user_id, snapshot_date, market_value, cost_basis)
+        SELECT user_id, %s, market_value, cost_basis FROM portfolio_valuation WHERE user_id = %s
+        ON DUPLICATE KEY UPDATE market_value = VALUES(market_value), cost_basis = VALUES(cost_basis)
+    """, (snapshot_date or date.today(), user_id))
+
+def apply_trade(cursor, user_id, symbol, quantity_delta, price):
+    # Must run inside the caller's transaction, after lock_valuation and before the portfolio row is modified.
+    lock_valuation(cursor, user_id)
+    cursor.execute("SELECT quantity, avg_price, last_price FROM portfolio WHERE user_id = %s AND stock_symbol = %s",
+                   (user_id, symbol))
+    rows = cursor.fetchall()
+    row = rows[0] if rows else None
+    old_quantity = int(row[0] or 0) if row else 0
+    avg_price = Decimal(str(row[1] or 0)) if row else Decimal(0)
+    last_price = Decimal(str(row[2])) if row and row[2] is not None else avg_price
+    price = quantize_price(price)
+
+    new_quantity = old_quantity + quantity_delta
+    market_delta = new_quantity * price - old_quantity * last_price
+    cost_delta = quantity_delta * (price if quantity_delta > 0 else avg_price)
+    cursor.execute("""
+        UPDATE portfolio_valuation SET market_value = market_value + %s, cost_basis = cost_basis + %s
+        WHERE user_id = %s
+    """, (market_delta, cost_delta, user_id))
+    record_snapshot(cursor, user_id)
+
+def apply_price_ticks(prices):
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        for symbol, price in prices.items():
+            price = quantize_price(price)
+            cursor.execute("""
+                UPDATE portfolio_valuation v
+                JOIN (
+                    SELECT user_id, SUM(quantity * (%s - COALESCE(last_price, avg_price))) AS delta
+                    FROM portfolio WHERE stock_symbol = %s GROUP BY user_id
+                ) d ON v.user_id = d.user_id
+                SET v.market_value = v.market_value + d.delta
+            """, (price, symbol))
+            cursor.execute("UPDATE portfolio SET last_price = %s WHERE stock_symbol = %s", (price, symbol))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def reconcile_valuations():
+    # recomputes every user's state from holdings to absorb rounding in the incremental updates
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        cursor.execute("""
+            INSERT INTO portfolio_valuation (user_id, market_value, cost_basis)
+            SELECT user_id, SUM(quantity * COALESCE(last_price, avg_price)), SUM(quantity * avg_price)
+            FROM portfolio GROUP BY user_id
+            ON DUPLICATE KEY UPDATE market_value = VALUES(market_value), cost_basis = VALUES(cost_basis)
+        """)
+        cursor.execute("""
+            UPDATE portfolio_valuation SET market_value = 0, cost_basis = 0
+            WHERE user_id NOT IN (SELECT DISTINCT user_id FROM portfolio)
+        """)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def record_daily_snapshots(snapshot_date=None):
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO portfolio_snapshots (user_id, snapshot_date, market_value, cost_basis)
+        SELECT user_id, %s, market_value, cost_basis FROM portfolio_valuation
+        ON DUPLICATE KEY UPDATE market_value = VALUES(market_value), cost_basis = VALUES(cost_basis)
+    """, (snapshot_date or date.today(),))
+    count = cursor.rowcount
+    cursor.close()
+    conn.close()
+    return count
+
+def ensure_valuation(user_id):
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction()
+        cursor.execute("SELECT 1 FROM portfolio_valuation WHERE user_id = %s", (user_id,))
+        if not cursor.fetchall():
+            _rebuild_valuation(cursor, user_id)
+            record_snapshot(cursor, user_id)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_snapshot_history(user_id, days=180):
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT snapshot_date, market_value, cost_basis FROM portfolio_snapshots
+        WHERE user_id = %s AND snapshot_date >= %s ORDER BY snapshot_date
+    """, (user_id, date.today() - timedelta(days=days)))
+    data = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    history = pd.DataFrame(data, columns=["Date", "Value", "Cost Basis"])
+    history[["Value", "Cost Basis"]] = history[["Value", "Cost Basis"]].astype(float)
+    history["Return (%)"] = (history["Value"] / history["Cost Basis"].where(history["Cost Basis"] != 0) - 1) * 100
+    return history
+
+def refresh_prices():
+    conn = db_config.get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT DISTINCT stock_symbol FROM portfolio")
+    symbols = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    if not symbols:
+        return {}
+
+    closes = market_data.download_closes(symbols, period="5d")
+    prices = {}
+    for symbol in symbols:
+        if closes[symbol].notna().any():
+            prices[symbol] = closes[symbol].dropna().iloc[-1]
+    apply_price_ticks(prices)
+    return prices
+
+if __name__ == "__main__":
+    prices = refresh_prices()
+    reconcile_valuations()
+    count = record_daily_snapshots()
+    print(f"Applied {len(prices)} price ticks; recorded {count} snapshot rows.")
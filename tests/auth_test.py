@@ -0,0 +1,79 @@
+import hashlib
+import unittest
+from unittest import mock
+import auth
+import db_config
+
+
+class TestPasswordHashing(unittest.TestCase):
+    def test_kdf_roundtrip(self):
+        stored = db_config.hash_password('s3cret', iterations=1000)
+        self.assertTrue(stored.startswith('pbkdf2_sha256$1000$'))
+        self.assertTrue(db_config.check_password('s3cret', stored))
+        self.assertFalse(db_config.check_password('wrong', stored))
+        self.assertTrue(db_config.password_needs_rehash(stored))
+
+    def test_legacy_sha256(self):
+        legacy = hashlib.sha256(b'test_password').hexdigest()
+        self.assertTrue(db_config.check_password('test_password', legacy))
+        self.assertTrue(db_config.password_needs_rehash(legacy))
+
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        auth._cache_put('alice', 7, db_config.hash_password('pw', iterations=1000))
+
+    def tearDown(self):
+        auth.invalidate_user('alice')
+
+    def test_roundtrip(self):
+        session = auth.verify_session(auth.issue_session(7, 'alice'))
+        self.assertEqual(session['uid'], 7)
+        self.assertEqual(session['usr'], 'alice')
+
+    def test_missing_expired_and_mismatched(self):
+        self.assertIsNone(auth.verify_session(None))
+        self.assertIsNone(auth.verify_session(auth.issue_session(7, 'alice', ttl=-1)))
+        self.assertIsNone(auth.verify_session(dict(auth.issue_session(7, 'alice'), uid=8)))
+
+    def test_password_change_revokes_sessions(self):
+        session = auth.issue_session(7, 'alice')
+        auth._cache_put('alice', 7, db_config.hash_password('new', iterations=1000))
+        self.assertIsNone(auth.verify_session(session))
+
+    def test_revoked_session_stays_revoked_after_eviction(self):
+        session = auth.issue_session(7, 'alice')
+        new_hash = db_config.hash_password('new', iterations=1000)
+        auth._cache_put('alice', 7, new_hash)
+        auth.invalidate_user('alice')
+        with mock.patch.object(db_config, 'get_user_credentials', return_value=(7, new_hash)) as lookup:
+            self.assertIsNone(auth.verify_session(session))
+            lookup.assert_called_once_with('alice')
+
+    def test_unknown_user_session_rejected(self):
+        session = auth.issue_session(7, 'alice')
+        auth.invalidate_user('alice')
+        with mock.patch.object(db_config, 'get_user_credentials', return_value=None):
+            self.assertIsNone(auth.verify_session(session))
+
+    def test_stale_cache_entry_is_reloaded(self):
+        new_hash = db_config.hash_password('new', iterations=1000)
+        with mock.patch.object(auth, 'USER_CACHE_TTL_SECONDS', -1), \
+                mock.patch.object(db_config, 'get_user_credentials', return_value=(7, new_hash)), \
+                mock.patch.object(db_config, 'password_needs_rehash', return_value=False):
+            self.assertIsNone(auth.authenticate('alice', 'pw'))
+            self.assertEqual(auth.authenticate('alice', 'new'), 7)
+
+    def test_unknown_user_still_checks_a_hash(self):
+        with mock.patch.object(db_config, 'get_user_credentials', return_value=None), \
+                mock.patch.object(db_config, 'check_password', return_value=False) as check:
+            self.assertIsNone(auth.authenticate('mallory', 'pw'))
+            check.assert_called_once_with('pw', auth._DUMMY_HASH)
+
+    def test_cache_is_bounded(self):
+        for i in range(auth.USER_CACHE_SIZE + 10):
+            auth._cache_put(f'user{i}', i, 'x')
+        self.assertLessEqual(len(auth._user_cache), auth.USER_CACHE_SIZE)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import unittest
+from datetime import datetime
+from batch_optimizer import group_problems, _recommendation_rows
+
+
+class TestGroupProblems(unittest.TestCase):
+    def test_users_with_same_holdings_share_a_problem(self):
+        rows = [(1, 'B'), (1, 'A'), (2, 'A'), (2, 'B'), (3, 'C')]
+        problems = group_problems(rows)
+        self.assertEqual(problems, {('A', 'B'): [1, 2], ('C',): [3]})
+
+    def test_empty_input(self):
+        self.assertEqual(group_problems([]), {})
+
+    def test_duplicate_symbol_rows_collapse(self):
+        problems = group_problems([(7, 'A'), (7, 'A')])
+        self.assertEqual(problems, {('A',): [7]})
+
+
+class TestRecommendationRows(unittest.TestCase):
+    def test_rows_fan_out_to_every_user(self):
+        generated_at = datetime(2024, 1, 2, 3, 4, 5)
+        problems = {('A', 'B'): [1, 2]}
+        results = [(('A', 'B'), {'A': 0.25, 'B': 0.7500004}, 'sampler')]
+        rows = list(_recommendation_rows(results, problems, generated_at))
+        self.assertEqual(rows, [
+            (1, 'A', 0.25, 'sampler', generated_at),
+            (1, 'B', 0.75, 'sampler', generated_at),
+            (2, 'A', 0.25, 'sampler', generated_at),
+            (2, 'B', 0.75, 'sampler', generated_at),
+        ])
+
+    def test_only_solved_problems_produce_rows(self):
+        problems = {('A',): [1], ('B',): [2]}
+        results = [(('B',), {'B': 1.0}, 'classical')]
+        rows = list(_recommendation_rows(results, problems, datetime(2024, 1, 1)))
+        self.assertEqual([row[0] for row in rows], [2])
+
+if __name__ == '__main__':
+    unittest.main()
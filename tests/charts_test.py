@@ -0,0 +1,58 @@
+import unittest
+import numpy as np
+from charts import lttb_indices, minmax_indices, downsample_ohlc, downsample_series, cumulative_returns_figure
+
+
+class TestChartDownsampling(unittest.TestCase):
+    def test_lttb_budget_and_endpoints(self):
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 50.0)
+        idx = lttb_indices(x, y, 100)
+        self.assertEqual(len(idx), 100)
+        self.assertEqual(idx[0], 0)
+        self.assertEqual(idx[-1], 999)
+        self.assertTrue(np.all(np.diff(idx) > 0))
+
+    def test_minmax_keeps_extremes(self):
+        y = np.zeros(1000)
+        y[123] = 5.0
+        y[777] = -5.0
+        idx = minmax_indices(y, 40)
+        self.assertLessEqual(len(idx), 42)
+        self.assertIn(123, idx)
+        self.assertIn(777, idx)
+
+    def test_small_series_untouched(self):
+        y = np.arange(10, dtype=float)
+        np.testing.assert_array_equal(lttb_indices(y, y, 50), np.arange(10))
+
+    def test_ohlc_bucketing(self):
+        dates = np.arange(8)
+        ohlc = np.array([[1, 2, 0.5, 1.5]] * 8, dtype=float)
+        ohlc[1, 1] = 9.0
+        ohlc[6, 2] = 0.1
+        ohlc[7, 3] = 3.0
+        x, bars = downsample_ohlc(dates, ohlc, 2)
+        np.testing.assert_array_equal(x, [0, 4])
+        np.testing.assert_array_equal(bars[0], [1, 9.0, 0.5, 1.5])
+        np.testing.assert_array_equal(bars[1], [1, 2, 0.1, 3.0])
+
+    def test_figure_cache_and_budget(self):
+        dates = np.arange('2020-01-01', '2024-12-31', dtype='datetime64[D]').astype('datetime64[ns]')
+        closes = np.cumsum(np.random.default_rng(0).normal(size=(len(dates), 3)), axis=0) + 100
+        first = cumulative_returns_figure(dates, closes, ['A', 'B', 'C'], point_budget=300)
+        second = cumulative_returns_figure(dates, closes, ['A', 'B', 'C'], point_budget=300)
+        self.assertEqual(first, second)
+        self.assertEqual(len(first['data']), 3)
+        x = dates.astype('datetime64[s]').astype(float)
+        for j in range(3):
+            self.assertEqual(len(downsample_series(x, closes[:, j], 100)), 100)
+            self.assertLessEqual(len(downsample_series(x, closes[:, j], 100, method='minmax')), 102)
+
+    def test_empty_figure_without_data(self):
+        dates = np.array([], dtype='datetime64[ns]')
+        fig = cumulative_returns_figure(dates, np.empty((0, 2)), ['A', 'B'])
+        self.assertEqual(fig['data'], [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
-from quantum_optimizer import qaoa_optimize
+from quantum_optimizer import qaoa_optimize, qaoa_sample_distribution, select_backend, get_solver_engine, _aer_backend
+from quantum_optimizer import qaoa_optimize_with_method
 
 
 class TestQAOAOptimize(unittest.TestCase):
@@ -15,5 +16,60 @@ class TestQAOAOptimize(unittest.TestCase):
         self.assertAlmostEqual(total, 1.0, places=3)
         self.assertSetEqual(set(alloc.keys()), set(stocks_data.keys()))
 
+    def test_sample_distribution(self):
+        stocks_data = {
+            'A': {'return': 0.12, 'volatility': 0.20},
+            'B': {'return': 0.08, 'volatility': 0.15},
+            'C': {'return': 0.10, 'volatility': 0.18},
+        }
+        samples = qaoa_sample_distribution(stocks_data, top_k=3, shots=128, p=1, max_qubits=8)
+        self.assertTrue(0 < len(samples) <= 3)
+        probs = [s['probability'] for s in samples]
+        self.assertEqual(probs, sorted(probs, reverse=True))
+        for s in samples:
+            # objective is the exact QUBO value of the sampled bitstring
+            expected = sum(-stocks_data[k]['return'] + stocks_data[k]['volatility'] ** 2 for k in s['selection'])
+            self.assertAlmostEqual(s['objective'], expected, places=6)
+            self.assertEqual(len(s['bitstring']), 3)
+
+    def test_blend_mode(self):
+        stocks_data = {
+            'A': {'return': 0.12, 'volatility': 0.20},
+            'B': {'return': 0.08, 'volatility': 0.15},
+            'C': {'return': 0.10, 'volatility': 0.18},
+        }
+        alloc = qaoa_optimize(stocks_data, shots=128, p=1, max_qubits=8, maxiter=50, mode='blend', top_k=4)
+        self.assertAlmostEqual(sum(alloc.values()), 1.0, places=3)
+        self.assertSetEqual(set(alloc.keys()), set(stocks_data.keys()))
+
+    def test_backend_selection(self):
+        # exact engines win for small problems, sampling engines once they are out of range
+        self.assertEqual(select_backend(4), 'exact')
+        self.assertEqual(select_backend(30, shots=1024), 'mps')
+        self.assertEqual(select_backend(30, shots=16, accuracy=0.1), 'classical')
+        self.assertEqual(select_backend(100), 'classical')
+
+    def test_engines_are_per_solve(self):
+        first = get_solver_engine('sampler', shots=128)
+        second = get_solver_engine('sampler', shots=128)
+        self.assertIsNot(first, second)
+        self.assertIs(_aer_backend('aer_simulator'), _aer_backend('aer_simulator'))
+
+    def test_auto_backend(self):
+        stocks_data = {
+            'A': {'return': 0.12, 'volatility': 0.20},
+            'B': {'return': 0.08, 'volatility': 0.15},
+        }
+        alloc = qaoa_optimize(stocks_data, backend_name='auto')
+        self.assertAlmostEqual(sum(alloc.values()), 1.0, places=3)
+
+    def test_reported_method(self):
+        stocks_data = {f'S{i}': {'return': 0.05 + i / 100, 'volatility': 0.2} for i in range(15)}
+        # more stocks than max_qubits falls back to the classical allocation
+        _, method = qaoa_optimize_with_method(stocks_data, backend_name='aer', max_qubits=12)
+        self.assertEqual(method, 'classical')
+        _, method = qaoa_optimize_with_method({'A': {'return': 0.1, 'volatility': 0.2}})
+        self.assertEqual(method, 'single')
+
 if __name__ == '__main__':
     unittest.main()
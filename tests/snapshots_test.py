@@ -0,0 +1,96 @@
+import unittest
+from decimal import Decimal
+from unittest import mock
+import snapshots
+
+
+class FakeCursor:
+    def __init__(self, holding=None, valuation_exists=True):
+        self.holding = holding
+        self.valuation_exists = valuation_exists
+        self.executed = []
+        self._result = []
+
+    def execute(self, query, params=None):
+        self.executed.append((" ".join(query.split()), params))
+        if "FROM portfolio_valuation WHERE user_id = %s FOR UPDATE" in query:
+            self._result = [(Decimal("0"),)] if self.valuation_exists else []
+        elif query.startswith("SELECT quantity, avg_price, last_price"):
+            self._result = [self.holding] if self.holding else []
+        else:
+            self._result = []
+
+    def fetchall(self):
+        return self._result
+
+    def valuation_update(self):
+        return next(params for query, params in self.executed if query.startswith("UPDATE portfolio_valuation SET"))
+
+
+class TickCursor:
+    # models one holding: portfolio.last_price is DECIMAL(10,2), so stored prices are rounded
+    def __init__(self, quantity, last_price, market_value):
+        self.quantity = quantity
+        self.last_price = Decimal(last_price)
+        self.market_value = Decimal(market_value)
+
+    def execute(self, query, params=None):
+        if "UPDATE portfolio_valuation v" in query:
+            price, _ = params
+            self.market_value += self.quantity * (price - self.last_price)
+        elif query.startswith("UPDATE portfolio SET last_price"):
+            self.last_price = Decimal(str(params[0])).quantize(Decimal("0.01"))
+
+    def close(self):
+        pass
+
+
+class TestQuantizePrice(unittest.TestCase):
+    def test_rounds_half_up_to_cents(self):
+        self.assertEqual(snapshots.quantize_price(100.004), Decimal("100.00"))
+        self.assertEqual(snapshots.quantize_price("100.005"), Decimal("100.01"))
+        self.assertEqual(snapshots.quantize_price(Decimal("99.999")), Decimal("100.00"))
+
+
+class TestApplyTrade(unittest.TestCase):
+    def test_buy_new_holding(self):
+        cursor = FakeCursor()
+        snapshots.apply_trade(cursor, 1, "A", 10, 100.004)
+        self.assertEqual(cursor.valuation_update(), (Decimal("1000.00"), Decimal("1000.00"), 1))
+
+    def test_buy_more_revalues_existing_shares(self):
+        cursor = FakeCursor(holding=(10, Decimal("90.00"), Decimal("95.00")))
+        snapshots.apply_trade(cursor, 1, "A", 5, Decimal("100"))
+        market_delta, cost_delta, _ = cursor.valuation_update()
+        self.assertEqual(market_delta, Decimal("550.00"))
+        self.assertEqual(cost_delta, Decimal("500.00"))
+
+    def test_sell_removes_cost_at_average_price(self):
+        cursor = FakeCursor(holding=(10, Decimal("90.00"), Decimal("95.00")))
+        snapshots.apply_trade(cursor, 1, "A", -4, Decimal("100"))
+        market_delta, cost_delta, _ = cursor.valuation_update()
+        self.assertEqual(market_delta, Decimal("-350.00"))
+        self.assertEqual(cost_delta, Decimal("-360.00"))
+
+    def test_missing_valuation_is_rebuilt_first(self):
+        cursor = FakeCursor(valuation_exists=False)
+        snapshots.apply_trade(cursor, 3, "A", 1, Decimal("10"))
+        rebuild = [(q, p) for q, p in cursor.executed if q.startswith("INSERT INTO portfolio_valuation")]
+        self.assertEqual(len(rebuild), 1)
+        self.assertEqual(rebuild[0][1], (3, 3))
+        self.assertIn("COALESCE(last_price, avg_price)", rebuild[0][0])
+
+
+class TestPriceTicks(unittest.TestCase):
+    def test_unchanged_price_adds_nothing(self):
+        cursor = TickCursor(10, "100.00", "1000.00")
+        conn = mock.Mock()
+        conn.cursor.return_value = cursor
+        with mock.patch.object(snapshots.db_config, "get_db_connection", return_value=conn):
+            for _ in range(1000):
+                snapshots.apply_price_ticks({"A": 100.004})
+        self.assertEqual(cursor.market_value, Decimal("1000.00"))
+        self.assertEqual(cursor.last_price, Decimal("100.00"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import yfinance as yf
 from db_config import get_db_connection
+import snapshots
 import time
 from decimal import Decimal
 
@@ -43,6 +44,9 @@ def buy_stock(user_id, symbol, quantity):
             return "Error: Could not fetch stock price."
 
         stock_price_decimal = Decimal(str(stock_price)) 
+        conn.start_transaction()
+        snapshots.lock_valuation(cursor, user_id)
+        snapshots.apply_trade(cursor, user_id, full_symbol, quantity, stock_price_decimal)
         cursor.execute("SELECT quantity, avg_price FROM portfolio WHERE user_id = %s AND stock_symbol = %s", 
                        (user_id, full_symbol))
         result = cursor.fetchone()  
@@ -53,11 +57,11 @@ def buy_stock(user_id, symbol, quantity):
             avg_price = Decimal(str(avg_price or 0)) 
             total_quantity = existing_quantity + quantity
             new_avg_price = ((existing_quantity * avg_price) + (quantity * stock_price_decimal)) / total_quantity
-            cursor.execute("UPDATE portfolio SET quantity = %s, avg_price = %s WHERE user_id = %s AND stock_symbol = %s",
-                           (total_quantity, new_avg_price, user_id, full_symbol))
+            cursor.execute("UPDATE portfolio SET quantity = %s, avg_price = %s, last_price = %s WHERE user_id = %s AND stock_symbol = %s",
+                           (total_quantity, new_avg_price, stock_price_decimal, user_id, full_symbol))
         else:
-            cursor.execute("INSERT INTO portfolio (user_id, stock_symbol, quantity, avg_price) VALUES (%s, %s, %s, %s)",
-                           (user_id, full_symbol, quantity, stock_price_decimal))
+            cursor.execute("INSERT INTO portfolio (user_id, stock_symbol, quantity, avg_price, last_price) VALUES (%s, %s, %s, %s, %s)",
+                           (user_id, full_symbol, quantity, stock_price_decimal, stock_price_decimal))
 
         conn.commit()
         cursor.close()
@@ -74,7 +78,9 @@ def sell_stock(user_id, symbol, quantity):
         conn = get_db_connection()
         cursor = conn.cursor(buffered=True) 
         full_symbol = symbol.upper() + ".BO"
-        cursor.execute("SELECT quantity, avg_price FROM portfolio WHERE user_id = %s AND stock_symbol = %s", 
+        conn.start_transaction()
+        snapshots.lock_valuation(cursor, user_id)
+        cursor.execute("SELECT quantity, avg_price FROM portfolio WHERE user_id = %s AND stock_symbol = %s FOR UPDATE", 
                        (user_id, full_symbol))
         result = cursor.fetchone()
 
@@ -101,9 +107,10 @@ def sell_stock(user_id, symbol, quantity):
         stock_price_decimal = Decimal(str(stock_price))  
         total_cost = quantity * stock_price_decimal
         new_quantity = existing_quantity - quantity
+        snapshots.apply_trade(cursor, user_id, full_symbol, -quantity, stock_price_decimal)
         if new_quantity > 0:
-            cursor.execute("UPDATE portfolio SET quantity = %s WHERE user_id=%s AND stock_symbol = %s",
-                           (new_quantity, user_id, full_symbol))
+            cursor.execute("UPDATE portfolio SET quantity = %s, last_price = %s WHERE user_id=%s AND stock_symbol = %s",
+                           (new_quantity, stock_price_decimal, user_id, full_symbol))
         else:
             cursor.execute("DELETE FROM portfolio WHERE user_id=%s AND stock_symbol = %s", (user_id, full_symbol))
         cursor.execute("""
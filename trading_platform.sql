@@ -27,6 +27,51 @@ CREATE TABLE IF NOT EXISTS portfolio (
     stock_symbol VARCHAR(10) NOT NULL,
     quantity INT NOT NULL,
     avg_price DECIMAL(10,2) NOT NULL,
+    last_price DECIMAL(10,2) NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_portfolio_symbol (stock_symbol),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_recommendations (
+    user_id INT NOT NULL,
+    stock_symbol VARCHAR(10) NOT NULL,
+    weight DECIMAL(8,6) NOT NULL,
+    method VARCHAR(20) NOT NULL,
+    generated_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (user_id, stock_symbol),
+    INDEX idx_recommendations_generated_at (generated_at),
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+-- existing databases: add the valuation column and symbol index only if they are missing
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.COLUMNS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'portfolio' AND COLUMN_NAME = 'last_price') = 0,
+              'ALTER TABLE portfolio ADD COLUMN last_price DECIMAL(10,2) NULL', 'DO 0');
+PREPARE migration FROM @ddl;
+EXECUTE migration;
+DEALLOCATE PREPARE migration;
+
+SET @ddl = IF((SELECT COUNT(*) FROM information_schema.STATISTICS
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'portfolio' AND INDEX_NAME = 'idx_portfolio_symbol') = 0,
+              'CREATE INDEX idx_portfolio_symbol ON portfolio (stock_symbol)', 'DO 0');
+PREPARE migration FROM @ddl;
+EXECUTE migration;
+DEALLOCATE PREPARE migration;
+
+CREATE TABLE IF NOT EXISTS portfolio_valuation (
+    user_id INT PRIMARY KEY,
+    market_value DECIMAL(15,2) NOT NULL DEFAULT 0,
+    cost_basis DECIMAL(15,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_snapshots (
+    user_id INT NOT NULL,
+    snapshot_date DATE NOT NULL,
+    market_value DECIMAL(15,2) NOT NULL,
+    cost_basis DECIMAL(15,2) NOT NULL,
+    PRIMARY KEY (user_id, snapshot_date),
     FOREIGN KEY (user_id) REFERENCES users(user_id) ON DELETE CASCADE
 );